@@ -1,206 +1,1091 @@
+import io
+import mmap
 import os
+import queue
 import re
 import sqlite3
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
 
-def rename_index_column(line):
+# Number of successfully executed commands between intermediate commits during import
+COMMIT_INTERVAL = 10_000
+
+# Maximum number of rows bound to a single executemany call during import
+INSERT_BATCH_SIZE = 1000
+
+# Bit mask on the command count deciding when the import loop reads the clock for rate reporting
+RATE_CHECK_MASK = 0x3FFF
+
+# Statements handed over at once by the conversion thread, and number of such chunks it may run ahead
+PIPELINE_CHUNK_SIZE = 1000
+PIPELINE_QUEUE_SIZE = 2
+
+# Seconds the conversion thread waits on a full queue before checking whether the consumer has stopped
+PIPELINE_PUT_TIMEOUT = 0.5
+
+# Number of prepared statements kept by each import connection, enough for one INSERT template per table
+STATEMENT_CACHE_SIZE = 1024
+
+# Regexes applied while converting the dump, compiled once instead of on every line.
+# The conversion works on raw bytes, so these are bytes patterns.
+_RE_CREATE_TABLE = re.compile(rb'CREATE TABLE (?:IF NOT EXISTS )?(\w+)')
+_RE_ALTER_PK = re.compile(rb'ALTER TABLE (?:ONLY )?(\w+) ADD CONSTRAINT \w+ PRIMARY KEY \((.*?)\)')
+
+# Matches the name, without its schema, of a table a statement of the unconverted dump creates or writes to
+_RE_TABLE_REFERENCE = re.compile(
+    rb'(?:CREATE TABLE (?:IF NOT EXISTS )?|INSERT INTO |UPDATE (?:ONLY )?|DELETE FROM (?:ONLY )?'
+    rb'|ALTER TABLE (?:IF EXISTS )?(?:ONLY )?|INDEX \w+ ON (?:ONLY )?)(?:\w+\.)?(\w+)'
+)
+
+# Plain substitutions, applied with bytes.replace
+_LITERAL_REPLACEMENTS = (
+    (b"public.", b""),  # Remove schema references
+    (b" USING btree", b""),  # Remove the index method
+)
+
+# Whole-word substitutions, fused into one alternation so a block is scanned once
+_RE_WORDS = re.compile(rb'\b(?:SERIAL|integer|bigint|index)\b')
+_WORD_REPLACEMENTS = {
+    b"SERIAL": b"INTEGER PRIMARY KEY AUTOINCREMENT",  # Replace SERIAL
+    b"integer": b"INTEGER",  # Ensure INTEGER is used
+    b"bigint": b"INTEGER",  # SQLite uses INTEGER for large integers
+    b"index": b"_index",  # Rename 'index' to '_index'
+}
+
+# Size of the blocks of whole lines the dump is converted in
+READ_BLOCK_SIZE = 1 << 20
+
+# Matches the "INSERT INTO table [(columns)] VALUES" head of an INSERT statement
+_RE_INSERT_PREFIX = re.compile(r'(INSERT INTO\s+[^\s(]+(?:\s*\([^)]*\))?)\s+VALUES\s*')
+
+# Parameterized INSERT statements keyed by (prefix, column count), see insert_template
+_insert_templates = {}
+
+# Range of the 64-bit signed integers SQLite can bind, wider numeric values are left to SQLite as SQL text
+SQLITE_INTEGER_MIN = -2**63
+SQLITE_INTEGER_MAX = 2**63 - 1
+
+# Matches a single literal of a VALUES tuple followed by the ',' or ')' that terminates it
+_RE_INSERT_VALUE = re.compile(
+    r"\s*(?:'((?:[^']|'')*)'"                                   # 'string' with '' escapes
+    r"|(NULL)"                                                 # NULL
+    r"|([-+]?\d+)"                                             # integer
+    r"|([-+]?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?\d+[eE][-+]?\d+)"  # real
+    r"|(true|false))"                                          # boolean
+    r"\s*([,)])"
+)
+
+# Matches a complete string literal or a line comment inside a column definition
+_RE_DEFINITION_SKIP = re.compile(r"'(?:[^']|'')*'|--[^\n]*")
+
+# Skips SQL text that leaves the command splitter in its normal state: plain text and complete string
+# literals or quoted identifiers. Stops at a ';', an unterminated quote, an E'' string, a comment or a
+# dollar quote.
+_RE_SQL_PLAIN = re.compile(
+    r"""(?:[^;'"\-/$]+|(?<![eE])'[^']*(?:''[^']*)*'|"[^"]*(?:""[^"]*)*"|-(?!-)|/(?!\*)|\$(?!(?:[A-Za-z_]\w*)?\$))*"""
+)
+
+# Matches the opening tag of a dollar-quoted string
+_RE_DOLLAR_TAG = re.compile(r'\$(?:[A-Za-z_]\w*)?\$')
+
+# Matches the opening of an E'' string
+_RE_ESCAPE_STRING_START = re.compile(r"(?<!\w)[eE]'")
+
+# Matches a backslash escape or a quote inside an E'' string
+_RE_ESCAPE_STRING_SPECIAL = re.compile(r"[\\']")
+
+class ParseState(Enum):
+    """
+    States of the SQL command splitter.
+    """
+    NORMAL = 0
+    SINGLE_QUOTE = 1
+    DOUBLE_QUOTE = 2
+    ESCAPE_STRING = 3
+    DOLLAR_QUOTE = 4
+    BLOCK_COMMENT = 5
+
+def _append_comma(definition):
+    """
+    Appends a comma to a column definition, before its trailing line comment if it has one.
+
+    Args:
+        definition (str): The column definition, without trailing whitespace.
+
+    Returns:
+        str: The definition followed by a comma.
+    """
+    last = None
+    for last in _RE_DEFINITION_SKIP.finditer(definition):
+        pass
+    if last is None or not last.group(0).startswith("--") or last.end() != len(definition):
+        return f"{definition},"
+    code_end = len(definition[:last.start()].rstrip())
+    return f"{definition[:code_end]},{definition[code_end:]}"
+
+@dataclass
+class CreateTable:
+    """
+    A CREATE TABLE statement being converted, serialized once all its constraints are known.
+
+    Attributes:
+        name (str): Name of the table.
+        head (str): The original "CREATE TABLE ... (" line, including its newline.
+        columns (list): Column definitions as written in the dump, possibly spanning several lines,
+            with their separating commas and comments.
+        constraints (list): Table constraints such as the PRIMARY KEY added by ALTER TABLE.
+        pending (list): Lines of the column definition being read, until its top-level comma.
+    """
+    name: str
+    head: str
+    columns: list = field(default_factory=list)
+    constraints: list = field(default_factory=list)
+    pending: list = field(default_factory=list)
+
+    def add_line(self, line):
+        """
+        Adds a line of the table body. A column definition is complete once a line ends with a comma
+        outside of any string literal, comment or parentheses.
+
+        Args:
+            line (str): The line, including its newline.
+        """
+        if not self.pending and not line.strip():
+            return
+        self.pending.append(line)
+        if self.pending_complete() and self.pending_code().rstrip().endswith(","):
+            self.columns.append("".join(self.pending).rstrip())
+            self.pending.clear()
+
+    def pending_code(self):
+        """
+        Returns the pending lines without their string literals and line comments.
+
+        Returns:
+            str: The SQL code of the pending definition.
+        """
+        return _RE_DEFINITION_SKIP.sub("", "".join(self.pending))
+
+    def pending_complete(self):
+        """
+        Tells whether the pending lines form a complete definition, i.e. are not inside a string
+        literal or parentheses.
+
+        Returns:
+            bool: True if the pending definition is complete.
+        """
+        code = self.pending_code()
+        return "'" not in code and code.count("(") == code.count(")")
+
+    def finish(self):
+        """
+        Adds the last column definition, which has no trailing comma, once the closing ');' is reached.
+        """
+        if self.pending:
+            self.columns.append("".join(self.pending).rstrip())
+            self.pending.clear()
+
+    def __str__(self):
+        definitions = list(self.columns)
+        if self.constraints:
+            # The last column has no separating comma yet
+            if definitions:
+                definitions[-1] = _append_comma(definitions[-1])
+            definitions.append(",\n".join(f"    {constraint}" for constraint in self.constraints))
+        body = "\n".join(definitions)
+        return f"{self.head}{body}\n);\n"
+
+def _word_replacement(match):
+    """
+    Returns the SQLite replacement for a match of the whole-word conversion regex.
+
+    Args:
+        match (re.Match): The matched PostgreSQL-specific fragment.
+
+    Returns:
+        bytes: The replacement text.
+    """
+    return _WORD_REPLACEMENTS[match.group(0)]
+
+def substitute(data):
+    """
+    Removes schema references, replaces PostgreSQL-specific syntax and renames 'index' to '_index'.
+
+    Meant to run on large blocks of lines: the literal substitutions are plain bytes.replace calls and the
+    whole-word regex only runs when one of its words occurs in the block, so most data blocks never reach
+    the regex engine.
+
+    Args:
+        data (bytes): The PostgreSQL SQL to convert.
+
+    Returns:
+        bytes: The converted SQL.
+    """
+    for old, new in _LITERAL_REPLACEMENTS:
+        data = data.replace(old, new)
+    if any(word in data for word in _WORD_REPLACEMENTS):
+        data = _RE_WORDS.sub(_word_replacement, data)
+    return data
+
+def fadvise(fd, advice):
+    """
+    Declares an access pattern for a whole file to the kernel. Does nothing on platforms without posix_fadvise.
+
+    Args:
+        fd (int): File descriptor of the open file.
+        advice (str): Name of the os.POSIX_FADV_* constant to apply.
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+
+def iter_dump_blocks(input_file, release=True):
+    """
+    Iterates over a dump file through a read-only memory map in blocks of about READ_BLOCK_SIZE bytes that
+    always end on a line boundary, without decoding them.
+
+    Args:
+        input_file (str): Path to the dump file.
+        release (bool, optional): Drop the file from the page cache once it is read. Defaults to True.
+
+    Yields:
+        bytes: Each block of whole lines.
+    """
+    with open(input_file, 'rb') as f:
+        # Empty files cannot be memory mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            pos = 0
+            size = len(mm)
+            while pos < size:
+                end = mm.find(b"\n", pos + READ_BLOCK_SIZE) + 1 or size
+                yield mm[pos:end]
+                pos = end
+
+        # The dump is not read again, release it from the page cache
+        if release:
+            fadvise(f.fileno(), "POSIX_FADV_DONTNEED")
+
+def collect_primary_keys(input_file):
+    """
+    Collects the primary keys added by ALTER TABLE statements of a PostgreSQL SQL dump file.
+
+    Args:
+        input_file (str): Path to the PostgreSQL SQL dump file.
+
+    Returns:
+        dict: Primary key columns keyed by table name, both as converted bytes.
+    """
+    primary_keys = {}
+    alter_parts = []  # Lines of the multi-line ALTER TABLE statement being read
+
+    # The dump is read again right after, so keep it in the page cache
+    for block in iter_dump_blocks(input_file, release=False):
+        # Only ALTER TABLE statements matter here, skip blocks without any
+        if b"ALTER TABLE" not in block and not alter_parts:
+            continue
+        for line in io.BytesIO(block):
+            stripped = line.strip()
+            if stripped.startswith(b"ALTER TABLE") or alter_parts:
+                alter_parts.append(substitute(stripped))
+
+                if b";" in line:  # End of the ALTER TABLE statement
+                    match = _RE_ALTER_PK.search(b" ".join(alter_parts))
+                    if match:
+                        table_name, columns = match.groups()
+                        primary_keys[table_name] = columns
+                    alter_parts.clear()
+
+    return primary_keys
+
+def collect_table_names(input_file):
+    """
+    Collects the names of the tables a PostgreSQL SQL dump file creates, alters, indexes or writes to.
+    Text inside string literals can add spurious names, which only makes the sharding more conservative.
+
+    Args:
+        input_file (str): Path to the PostgreSQL SQL dump file.
+
+    Returns:
+        set: The table names, as bytes and without their schema.
     """
-    Renames the 'index' column to '_index' in SQL statements, ensuring it only applies to column names
-    and not to string values or other parts of the SQL.
+    table_names = set()
+    # The dump is converted later on, keep it in the page cache
+    for block in iter_dump_blocks(input_file, release=False):
+        table_names.update(_RE_TABLE_REFERENCE.findall(block))
+    return table_names
 
+def iter_converted_block_lines(input_file):
+    """
+    Iterates over the lines of a dump file after applying substitute to each block of lines.
 
     Args:
-        line (str): The SQL line to process.
+        input_file (str): Path to the PostgreSQL SQL dump file.
+
+    Yields:
+        bytes: Each substituted line, including its trailing newline.
+    """
+    for block in iter_dump_blocks(input_file):
+        yield from io.BytesIO(substitute(block))
+
+def iter_converted_lines(input_file, index_lines):
+    """
+    Converts a PostgreSQL SQL dump file to SQLite-compatible SQL, line by line.
+
+    The dump is scanned once beforehand for the primary keys added by ALTER TABLE statements, so they can
+    be added to the CREATE TABLE statements as those are streamed. CREATE TABLE statements are parsed into
+    CreateTable objects and yielded once complete. Other lines are processed as raw bytes, so the bulk of the
+    dump is never decoded or re-encoded.
+
+    Args:
+        input_file (str): Path to the PostgreSQL SQL dump file.
+        index_lines (list): Receives the CREATE INDEX and CREATE UNIQUE INDEX lines, which are held back so the
+            indexes can be built after all rows are loaded.
+
+    Yields:
+        bytes: Each converted line.
+    """
+    primary_keys = collect_primary_keys(input_file)
+    current_table = None  # CREATE TABLE statement being read
+    in_alter_table = False  # Whether the current line belongs to an ALTER TABLE statement
+
+    for line in iter_converted_block_lines(input_file):
+        # Fast path for data lines, by far the most common ones
+        if line.startswith(b"INSERT INTO") and current_table is None and not in_alter_table:
+            yield line
+            continue
+
+        # Skip PostgreSQL-specific commands
+        if line.startswith(b"SET ") or line.startswith(b"SELECT pg_catalog.set_config"):
+            continue
 
+        # Remove PostgreSQL-specific table options
+        if b"WITH (" in line or b"OIDS=" in line:
+            continue
+
+        stripped = line.strip()
+
+        # Capture CREATE TABLE statements, unless complete on a single line
+        if stripped.startswith(b"CREATE TABLE") and not stripped.endswith(b";"):
+            current_table = CreateTable(_RE_CREATE_TABLE.search(line).group(1).decode('utf-8'), line.decode('utf-8'))
+            continue
+
+        if stripped.startswith(b");") and current_table and current_table.pending_complete():
+            # End of CREATE TABLE statement, add its PRIMARY KEY constraint if any
+            current_table.finish()
+            columns = primary_keys.get(current_table.name.encode('utf-8'))
+            if columns is not None and current_table.columns:
+                current_table.constraints.append(f"PRIMARY KEY ({columns.decode('utf-8')})")
+            # One line at a time, as iter_sql_commands expects
+            yield from str(current_table).encode('utf-8').splitlines(keepends=True)
+            current_table = None
+            continue
+
+        if current_table:
+            # Add the line to the column definitions of the current CREATE TABLE statement
+            current_table.add_line(line.decode('utf-8'))
+            continue
+
+        # ALTER TABLE statements were handled by collect_primary_keys
+        if stripped.startswith(b"ALTER TABLE") or in_alter_table:
+            in_alter_table = b";" not in line
+            continue
+
+        # Handle Index Creation
+        if line.startswith((b"CREATE INDEX", b"CREATE UNIQUE INDEX")):
+            index_lines.append(line)
+            continue
+
+        yield line
+
+def iter_sqlite_statements(input_file, index_lines):
+    """
+    Converts a PostgreSQL SQL dump file to ready-to-execute SQLite statements, without a staging file.
+
+    Args:
+        input_file (str): Path to the PostgreSQL SQL dump file.
+        index_lines (list): Receives the CREATE INDEX lines, see iter_converted_lines.
 
     Returns:
-        str: The processed SQL line with 'index' renamed to '_index'.
+        iterator: The SQLite-compatible SQL statements.
     """
-    # Use a regex to match 'index' only when it is a column name
-    # Match 'index' when it is surrounded by spaces, commas, parentheses, or the start/end of the line
-    line = re.sub(r'(?<!\w)index(?!\w)', '_index', line)
-    return line
+    return iter_sql_commands(line.decode('utf-8') for line in iter_converted_lines(input_file, index_lines))
 
 def convert_postgres_to_sqlite(input_file, output_file):
     """
     Converts a PostgreSQL SQL dump file to an SQLite-compatible SQL file.
 
+    CREATE INDEX statements are written to a separate "<output_file>.indexes.sql" file so the indexes
+    can be built after all rows are loaded.
+
     Args:
         input_file (str): Path to the PostgreSQL SQL dump file.
         output_file (str): Path to save the SQLite-compatible SQL file.
     """
-    create_table_statements = {}
-    alter_table_buffer = ""  # Buffer to store multi-line ALTER TABLE statements
-
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for line in infile:
-            # Skip PostgreSQL-specific commands
-            if line.startswith("SET ") or line.startswith("SELECT pg_catalog.set_config"):
-                continue
-
-            # Remove schema references like "public."
-            line = re.sub(r'public\.', '', line)
-
-            # Replace PostgreSQL-specific data types or syntax
-            line = line.replace("SERIAL", "INTEGER PRIMARY KEY AUTOINCREMENT")  # Replace SERIAL
-            line = line.replace("integer", "INTEGER")  # Ensure INTEGER is used
-            line = line.replace("bigint", "INTEGER")  # SQLite uses INTEGER for large integers
-
-            # Rename 'index' to '_index'
-            line = rename_index_column(line)
-
-            # Remove PostgreSQL-specific table options
-            if "WITH (" in line or "OIDS=" in line:
-                continue
-
-            # Capture CREATE TABLE statements
-            if line.strip().startswith("CREATE TABLE"):
-                table_name = re.search(r'CREATE TABLE (\w+)', line).group(1)
-                create_table_statements[table_name] = [line]
-                continue
-
-            if line.strip().startswith(");") and create_table_statements:
-                # End of CREATE TABLE statement
-                table_name = list(create_table_statements.keys())[-1]
-                create_table_statements[table_name].append(line)
-                outfile.write("".join(create_table_statements[table_name]))
-                del create_table_statements[table_name]
-                continue
-
-            if create_table_statements:
-                # Append lines to the current CREATE TABLE statement
-                table_name = list(create_table_statements.keys())[-1]
-                create_table_statements[table_name].append(line)
-                continue
-
-            # Handle multi-line ALTER TABLE statements
-            if line.strip().startswith("ALTER TABLE") or alter_table_buffer:
-                if alter_table_buffer:
-                    alter_table_buffer += " " + line.strip()  # Ensure space before appending
-                else:
-                    alter_table_buffer = line.strip()
+    index_lines = []
 
-                if ";" in line:  # End of the ALTER TABLE statement
-                    match = re.search(r'ALTER TABLE (\w+) ADD CONSTRAINT \w+ PRIMARY KEY \((.*?)\)', alter_table_buffer)
-                    if match:
-                        table_name, columns = match.groups()
-                        # Search for the corresponding CREATE TABLE statement in the output file
-                        with open(output_file, 'r') as temp_file:
-                            lines = temp_file.readlines()
-
-                        with open(output_file, 'w') as temp_file:
-                            for temp_line in lines:
-                                if temp_line.strip().startswith(f"CREATE TABLE {table_name}"):
-                                    # Add PRIMARY KEY to the CREATE TABLE statement
-                                    temp_file.write(temp_line)
-                                    while not temp_line.strip().endswith(");"):
-                                        temp_line = next(lines)
-                                        if temp_line.strip() == ");":
-                                            temp_line = f"    PRIMARY KEY ({columns})\n);\n"
-                                        temp_file.write(temp_line)
-                                else:
-                                    temp_file.write(temp_line)
-                    alter_table_buffer = ""  # Clear the buffer
-                continue
-
-            # Handle Index Creation
-            if line.startswith("CREATE INDEX"):
-                # Remove the USING btree part
-                line = re.sub(r' USING btree', '', line)
-                outfile.write(f"{line}\n")
-                continue
-
-            # Write the modified line to the output file
-            outfile.write(line)
+    with open(output_file, 'wb') as outfile:
+        # Write the modified lines to the output file
+        outfile.writelines(iter_converted_lines(input_file, index_lines))
+
+    with open(f"{output_file}.indexes.sql", 'wb') as index_file:
+        index_file.writelines(index_lines)
 
     print(f"Conversion complete! SQLite-compatible SQL saved to {output_file}")
 
+def insert_template(prefix, column_count):
+    """
+    Returns the parameterized INSERT for a table and column count. Templates are cached so every row of a
+    table shares the same string, which sqlite3 maps to one prepared statement.
+
+    Args:
+        prefix (str): The "INSERT INTO table [(columns)]" head of the statement.
+        column_count (int): Number of values per row.
+
+    Returns:
+        str: The INSERT statement with one '?' placeholder per value.
+    """
+    key = (prefix, column_count)
+    template = _insert_templates.get(key)
+    if template is None:
+        placeholders = ", ".join("?" * column_count)
+        template = _insert_templates[key] = f"{prefix} VALUES ({placeholders})"
+    return template
+
+def parse_insert_values(command):
+    """
+    Parses a plain INSERT statement into a parameterized template and its rows of bound values.
+    Only statements whose values are all literals (strings, numbers, NULL, booleans) are parsed.
+
+    Args:
+        command (str): The complete INSERT statement.
+
+    Returns:
+        tuple: (template, rows) where template is the INSERT with '?' placeholders and rows is a
+            list of value tuples, or None if the statement cannot be bound as parameters.
+    """
+    match = _RE_INSERT_PREFIX.match(command)
+    if not match:
+        return None
+
+    pos = match.end()
+    end = len(command)
+    rows = []
+    while True:
+        if pos >= end or command[pos] != '(':
+            return None
+        pos += 1
+
+        # Extract each literal of the tuple up to its closing parenthesis
+        row = []
+        while True:
+            value = _RE_INSERT_VALUE.match(command, pos)
+            if not value:
+                return None
+            text, null, integer, real, boolean, terminator = value.groups()
+            if text is not None:
+                row.append(text.replace("''", "'"))
+            elif null is not None:
+                row.append(None)
+            elif integer is not None:
+                integer = int(integer)
+                if not SQLITE_INTEGER_MIN <= integer <= SQLITE_INTEGER_MAX:
+                    return None
+                row.append(integer)
+            elif real is not None:
+                row.append(float(real))
+            else:
+                row.append(1 if boolean == "true" else 0)
+            pos = value.end()
+            if terminator == ')':
+                break
+        rows.append(tuple(row))
+
+        # Either another tuple follows or the statement ends
+        while pos < end and command[pos].isspace():
+            pos += 1
+        if pos < end and command[pos] == ',':
+            pos += 1
+            while pos < end and command[pos].isspace():
+                pos += 1
+            continue
+        if command[pos:].strip() == ';':
+            break
+        return None
+
+    if any(len(row) != len(rows[0]) for row in rows):
+        return None
+    return insert_template(match.group(1), len(rows[0])), rows
+
+def execute_command(cursor, command):
+    """
+    Executes a single SQL command, logging any error instead of aborting the surrounding transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the connection the command is executed on.
+        command (str): The SQL command to execute.
+
+    Returns:
+        bool: True if the command executed successfully, False otherwise.
+    """
+    try:
+        cursor.execute(command)
+        return True
+    except sqlite3.Error as e:
+        print(f"Error executing command: {command}\nError: {e}")
+        return False
+
+def execute_insert_batch(cursor, template, rows):
+    """
+    Inserts a batch of rows with a single executemany call. If the batch fails, it is rolled back
+    and the rows are inserted one by one so only the offending rows are skipped and logged.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the connection the rows are inserted on.
+        template (str): Parameterized INSERT statement shared by all rows.
+        rows (list): Value tuples to bind to the template.
+
+    Returns:
+        int: Number of rows inserted successfully.
+    """
+    cursor.execute("SAVEPOINT insert_batch")
+    try:
+        cursor.executemany(template, rows)
+        cursor.execute("RELEASE insert_batch")
+        return len(rows)
+    except (sqlite3.Error, OverflowError):
+        cursor.execute("ROLLBACK TO insert_batch")
+        cursor.execute("RELEASE insert_batch")
+
+    inserted = 0
+    for row in rows:
+        try:
+            cursor.execute(template, row)
+            inserted += 1
+        except (sqlite3.Error, OverflowError) as e:
+            print(f"Error executing command: {template} with values {row}\nError: {e}")
+    return inserted
+
+def iter_sql_commands(f):
+    """
+    Splits an SQL file into complete commands, even if they span multiple lines. A small state machine
+    tracks string literals (including E'' strings), quoted identifiers, dollar quotes and comments, so
+    only a semicolon outside of them ends a command. Comments are dropped from the commands.
+
+    Args:
+        f (file): The open SQL file.
+
+    Yields:
+        str: Each complete SQL command, including its terminating semicolon.
+    """
+    command_parts = []  # Pieces of the current command, joined once it is complete
+    state = ParseState.NORMAL
+    dollar_tag = None
+
+    for line in f:
+        pos = 0  # Scan position in the line
+        segment_start = 0  # Start of the part of the line not yet added to the command
+        end = len(line)
+
+        while pos < end:
+            if state is ParseState.NORMAL:
+                pos = _RE_SQL_PLAIN.match(line, pos).end()
+                if pos >= end:
+                    break
+                char = line[pos]
+                if char == ";":
+                    pos += 1
+                    command_parts.append(line[segment_start:pos])
+                    command = "".join(command_parts).strip()
+                    if command != ";":
+                        yield command
+                    command_parts.clear()  # Reset for the next command
+                    segment_start = pos
+                elif char == "'":
+                    # E'' strings allow backslash escapes, other literals continue on the next line
+                    if pos > 0 and _RE_ESCAPE_STRING_START.match(line, pos - 1):
+                        state = ParseState.ESCAPE_STRING
+                    else:
+                        state = ParseState.SINGLE_QUOTE
+                    pos += 1
+                elif char == '"':
+                    state = ParseState.DOUBLE_QUOTE
+                    pos += 1
+                elif char == "-":
+                    # Drop the rest of the line, keeping its newline as a separator
+                    command_parts.append(line[segment_start:pos])
+                    command_parts.append("\n")
+                    segment_start = end
+                    break
+                elif char == "/":
+                    command_parts.append(line[segment_start:pos])
+                    state = ParseState.BLOCK_COMMENT
+                    pos += 2
+                else:
+                    dollar_tag = _RE_DOLLAR_TAG.match(line, pos).group(0)
+                    state = ParseState.DOLLAR_QUOTE
+                    pos += len(dollar_tag)
+
+            elif state is ParseState.SINGLE_QUOTE or state is ParseState.DOUBLE_QUOTE:
+                quote = "'" if state is ParseState.SINGLE_QUOTE else '"'
+                index = line.find(quote, pos)
+                if index < 0:
+                    break
+                if line.startswith(quote, index + 1):
+                    pos = index + 2  # Doubled quote, still inside the literal
+                else:
+                    pos = index + 1
+                    state = ParseState.NORMAL
+
+            elif state is ParseState.ESCAPE_STRING:
+                match = _RE_ESCAPE_STRING_SPECIAL.search(line, pos)
+                if not match:
+                    break
+                index = match.start()
+                if line[index] == "\\":
+                    pos = index + 2  # Skip the escaped character
+                elif line.startswith("'", index + 1):
+                    pos = index + 2
+                else:
+                    pos = index + 1
+                    state = ParseState.NORMAL
+
+            elif state is ParseState.DOLLAR_QUOTE:
+                index = line.find(dollar_tag, pos)
+                if index < 0:
+                    break
+                pos = index + len(dollar_tag)
+                state = ParseState.NORMAL
+
+            else:  # ParseState.BLOCK_COMMENT
+                index = line.find("*/", pos)
+                if index < 0:
+                    segment_start = end
+                    break
+                pos = index + 2
+                segment_start = pos
+                state = ParseState.NORMAL
+
+        # Accumulate the rest of the line into the command buffer
+        if state is not ParseState.BLOCK_COMMENT:
+            command_parts.append(line[segment_start:])
+
+    # Yield the trailing command, if any
+    command = "".join(command_parts).strip()
+    if command:
+        yield command
+
+def configure_bulk_load(cursor):
+    """
+    Enables WAL mode and tunes the connection for bulk loading: larger page cache, memory-mapped I/O,
+    in-memory temporary storage, less frequent syncs and checkpoints, an exclusive lock so the pager
+    does not re-check the shared state on every transaction, and no foreign key enforcement (checked once
+    by check_foreign_keys after the load). Apart from journal_mode these settings only last as long as the
+    connection, so the database is left with the defaults for later users.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor of the connection to configure.
+    """
+    cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute("PRAGMA synchronous=NORMAL;")
+    cursor.execute("PRAGMA cache_size=-1048576;")  # 1 GiB
+    cursor.execute("PRAGMA mmap_size=30000000000;")
+    cursor.execute("PRAGMA temp_store=MEMORY;")
+    cursor.execute("PRAGMA locking_mode=EXCLUSIVE;")
+    cursor.execute("PRAGMA wal_autocheckpoint=10000;")
+    cursor.execute("PRAGMA foreign_keys=OFF;")
+
 def import_to_sqlite(db_file, sql_file):
     """
-    Imports an SQLite-compatible SQL file into the specified SQLite database with WAL mode enabled.
-    Executes CREATE TABLE, INSERT INTO, ADD CONSTRAINT, and CREATE INDEX commands properly, even if they span multiple lines.
+    Imports an SQLite-compatible SQL file into the specified SQLite database.
+    Executes every command of the file, even if it spans multiple lines or contains semicolons inside string literals.
 
     Args:
         db_file (str): Path to the SQLite database file.
         sql_file (str): Path to the SQLite-compatible SQL file.
     """
-    conn = sqlite3.connect(db_file)
+    # Read the SQL file line by line
+    with open(sql_file, 'r') as f:
+        fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+        import_commands(db_file, iter_sql_commands(f))
+
+def import_commands(db_file, commands):
+    """
+    Executes SQL commands against the specified SQLite database with WAL mode enabled.
+    All commands run inside explicit transactions that are committed every COMMIT_INTERVAL commands.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        commands (iterable): The complete SQL commands to execute.
+    """
+    # Manage transactions manually instead of relying on the implicit ones of the sqlite3 module
+    conn = sqlite3.connect(db_file, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
     cursor = conn.cursor()
 
-    # Enable WAL mode
-    cursor.execute("PRAGMA journal_mode=WAL;")
+    configure_bulk_load(cursor)
 
-    # Read the SQL file line by line
-    with open(sql_file, 'r') as f:
-        current_command = ""
-        command_count = 0
-        start_time = time.time()
-
-        # Keywords to detect the start of a new SQL command
-        command_keywords = ("CREATE TABLE", "INSERT INTO", "ADD CONSTRAINT", "CREATE INDEX")
-
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('--') or line.startswith('/*'):
-                continue  # Skip empty lines and comments
-
-            # If the line starts with a command keyword, process the previous command (if any)
-            if any(line.startswith(keyword) for keyword in command_keywords):
-                if current_command:  # Execute the accumulated command
-                    try:
-                        cursor.execute(current_command)
-                        command_count += 1
-                    except sqlite3.OperationalError as e:
-                        print(f"Error executing command: {current_command}\nError: {e}")
-                    current_command = ""  # Reset for the next command
-
-            # Accumulate the current line into the command buffer
-            current_command += line + " "
-
-            # If the command ends with a semicolon, execute it
-            if current_command.endswith(';'):
-                try:
-                    cursor.execute(current_command)
-                    command_count += 1
-                except sqlite3.OperationalError as e:
-                    print(f"Error executing command: {current_command}\nError: {e}")
-                current_command = ""  # Reset for the next command
-
-            # Check if one second has passed for rate reporting
-            if time.time() - start_time >= 1:
-                print(f"Processed {command_count} commands in the last second.")
-                start_time = time.time()  # Reset the timer
+    cursor.execute("BEGIN")
+
+    command_count = 0
+    uncommitted_count = 0
+    start_time = time.monotonic()
+
+    # Consecutive INSERTs sharing a template are bound in batches instead of executed one by one
+    batch_template = None
+    batch_rows = []
+
+    for command in commands:
+        insert = parse_insert_values(command)
+        if insert:
+            template, rows = insert
+            if template != batch_template or len(batch_rows) >= INSERT_BATCH_SIZE:
+                if batch_rows:
+                    uncommitted_count += execute_insert_batch(cursor, batch_template, batch_rows)
+                batch_template = template
+                batch_rows = []
+            batch_rows.extend(rows)
+            command_count += 1
+        else:
+            # Flush pending rows so statements keep their original order
+            if batch_rows:
+                uncommitted_count += execute_insert_batch(cursor, batch_template, batch_rows)
+                batch_template = None
+                batch_rows = []
+            if execute_command(cursor, command):
+                command_count += 1
+                uncommitted_count += 1
+
+        # Periodically commit so the WAL does not grow without bound
+        if uncommitted_count >= COMMIT_INTERVAL:
+            conn.commit()
+            cursor.execute("BEGIN")
+            uncommitted_count = 0
+
+        # Check if one second has passed for rate reporting, reading the clock only every RATE_CHECK_MASK + 1 commands
+        if (command_count & RATE_CHECK_MASK) == 0 and command_count:
+            elapsed = time.monotonic() - start_time
+            if elapsed >= 1:
+                print(f"Processed {command_count} commands in the last {elapsed:.1f} seconds.")
+                start_time = time.monotonic()  # Reset the timer
                 command_count = 0  # Reset the command count
 
+    # Insert the remaining batched rows
+    if batch_rows:
+        execute_insert_batch(cursor, batch_template, batch_rows)
+
     # Commit transaction
     conn.commit()
     conn.close()
     print(f"Data imported successfully into {db_file}.")
 
-def convert_directory(input_dir, output_dir, db_file):
+def import_files(db_file, sql_files):
     """
-    Converts all PostgreSQL SQL dump files in a directory to SQLite-compatible SQL files and imports them into an SQLite database.
+    Imports SQLite-compatible SQL files one by one into the specified SQLite database.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        sql_files (list): Paths to the SQLite-compatible SQL files.
+
+    Returns:
+        list: The CREATE INDEX lines held back during conversion, to run once all rows are loaded.
+    """
+    index_lines = []
+    for sql_file in sql_files:
+        import_to_sqlite(db_file, sql_file)
+        with open(f"{sql_file}.indexes.sql", 'rb') as index_file:
+            index_lines.extend(index_file)
+
+        # Remove the temporary output files after import (comment these lines if you want to keep them)
+        os.remove(f"{sql_file}.indexes.sql")
+        os.remove(sql_file)
+    return index_lines
+
+def iter_in_background(iterable):
+    """
+    Consumes an iterable in a background thread, handing its items over through a bounded queue in chunks of
+    PIPELINE_CHUNK_SIZE. The thread runs at most PIPELINE_QUEUE_SIZE chunks ahead of the consumer. Exceptions
+    raised by the iterable are re-raised in the consumer. If the consumer stops early, the thread stops too and
+    closes the iterable, releasing the dump it reads.
+
+    Args:
+        iterable (iterable): The items to produce, e.g. converted SQL statements.
+
+    Yields:
+        The items of the iterable, in order.
+    """
+    chunks = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    done = object()  # Sentinel marking the end of the items
+    stop = threading.Event()  # Set once the consumer no longer reads the queue
+
+    def put(item):
+        # Retry with a timeout instead of blocking forever on a queue nobody reads anymore
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=PIPELINE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            chunk = []
+            for item in iterable:
+                chunk.append(item)
+                if len(chunk) >= PIPELINE_CHUNK_SIZE:
+                    if not put(chunk):
+                        return
+                    chunk = []
+            if chunk and not put(chunk):
+                return
+            put(done)
+        except BaseException as e:
+            put(e)
+        finally:
+            # Release the dump file and its memory map even if the iterable was not exhausted
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield from chunk
+        producer.join()
+    finally:
+        stop.set()
+
+def import_dumps(db_file, input_files):
+    """
+    Converts PostgreSQL SQL dump files one by one and executes the converted statements directly against the
+    specified SQLite database, without writing staging files.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        input_files (list): Paths to the PostgreSQL SQL dump files.
+
+    Returns:
+        list: The CREATE INDEX lines held back during conversion, to run once all rows are loaded.
+    """
+    index_lines = []
+    for input_file in input_files:
+        # Convert in a background thread so conversion overlaps with SQLite executing the statements
+        import_commands(db_file, iter_in_background(iter_sqlite_statements(input_file, index_lines)))
+    return index_lines
+
+def partition_by_table(input_files, table_names, shards):
+    """
+    Spreads dump files over shards so that all files touching the same table land in the same shard, since a table
+    created by one file and filled by another must be in the same database. Files sharing tables are grouped, and the
+    groups are balanced over the shards by file size. Fewer than the requested shards are used if there are fewer
+    independent groups.
+
+    Args:
+        input_files (list): Paths to the PostgreSQL SQL dump files.
+        table_names (list): The table names of each file, as returned by collect_table_names.
+        shards (int): Maximum number of shards.
+
+    Returns:
+        list: The non-empty shards, each a list of indices into input_files in their original order.
+    """
+    # Merge each file with the existing groups it shares a table with, groups stay disjoint
+    groups = []  # (file indices, table names) of each group
+    for index, tables in enumerate(table_names):
+        indices, merged_tables = [index], set(tables)
+        remaining = []
+        for group_indices, group_tables in groups:
+            if group_tables & merged_tables:
+                indices.extend(group_indices)
+                merged_tables |= group_tables
+            else:
+                remaining.append((group_indices, group_tables))
+        groups = remaining + [(indices, merged_tables)]
+
+    # Largest groups first, each to the least loaded shard
+    sizes = [os.path.getsize(input_file) for input_file in input_files]
+    groups.sort(key=lambda group: sum(sizes[index] for index in group[0]), reverse=True)
+    partitions = [[] for _ in range(min(shards, len(groups)))]
+    loads = [0] * len(partitions)
+    for indices, _ in groups:
+        shard = loads.index(min(loads))
+        partitions[shard].extend(indices)
+        loads[shard] += sum(sizes[index] for index in indices)
+    return [sorted(partition) for partition in partitions]
+
+def merge_shards(db_file, shard_files):
+    """
+    Merges shard databases into the specified SQLite database by attaching each shard and copying its
+    tables, then recreating its indexes once the rows are in place. Shard files are removed afterwards.
+
+    Args:
+        db_file (str): Path to the SQLite database file to merge into.
+        shard_files (list): Paths to the shard database files.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    configure_bulk_load(cursor)
+
+    for shard_file in shard_files:
+        cursor.execute("ATTACH DATABASE ? AS shard", (shard_file,))
+        existing_tables = {row[0] for row in cursor.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+        # Tables first so their rows are copied before any index is built
+        objects = cursor.execute(
+            "SELECT type, name, sql FROM shard.sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type = 'index'"
+        ).fetchall()
+
+        cursor.execute("BEGIN")
+        for object_type, name, sql in objects:
+            if object_type == 'table':
+                if name not in existing_tables:
+                    execute_command(cursor, sql)
+                execute_command(cursor, f'INSERT INTO main."{name}" SELECT * FROM shard."{name}"')
+            else:
+                execute_command(cursor, sql)
+        conn.commit()
+        cursor.execute("DETACH DATABASE shard")
+
+        os.remove(shard_file)
+        print(f"Merged {shard_file} into {db_file}.")
+
+    conn.close()
+
+def import_indexes(db_file, index_lines):
+    """
+    Creates the indexes collected during conversion in a single transaction, once all rows are loaded.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+        index_lines (list): The CREATE INDEX lines, as bytes.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    cursor = conn.cursor()
+    configure_bulk_load(cursor)
+
+    cursor.execute("BEGIN")
+    for command in iter_sql_commands(line.decode('utf-8') for line in index_lines):
+        execute_command(cursor, command)
+    conn.commit()
+    conn.close()
+    print(f"Indexes created successfully in {db_file}.")
+
+def check_foreign_keys(db_file):
+    """
+    Validates every foreign key of the database at once, after the bulk load, and reports the violations.
+
+    Args:
+        db_file (str): Path to the SQLite database file.
+
+    Returns:
+        int: Number of rows violating a foreign key constraint.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON;")
+
+    violations = {}
+    try:
+        for table, _, parent, _ in cursor.execute("PRAGMA foreign_key_check;"):
+            violations[(table, parent)] = violations.get((table, parent), 0) + 1
+    except sqlite3.Error as e:
+        # E.g. a foreign key whose parent columns lost their UNIQUE constraint during conversion
+        print(f"Error executing command: PRAGMA foreign_key_check;\nError: {e}")
+    finally:
+        conn.close()
+
+    for (table, parent), count in violations.items():
+        print(f"Foreign key check: {count} rows of {table} reference missing rows of {parent}.")
+    return sum(violations.values())
+
+def convert_directory(input_dir, output_dir, db_file, max_workers=None, shards=1, staging=False):
+    """
+    Converts all PostgreSQL SQL dump files in a directory and imports them into an SQLite database.
+
+    By default each dump is converted while it is imported, in a background thread whose statements are executed
+    directly. With staging enabled, the dumps are converted in parallel by a pool of worker processes to
+    SQLite-compatible SQL files, each of which is imported as soon as it is ready; useful to inspect the converted SQL.
+
+    With a single shard the dumps are imported one by one, since SQLite only allows a single writer per database.
+    With several shards they are spread over that many temporary databases which are written in parallel and
+    merged into the SQLite database at the end. Dumps touching the same table are imported into the same shard, in
+    order, so only dumps without tables in common are written in parallel.
 
     Args:
         input_dir (str): Path to the directory containing PostgreSQL SQL dump files.
-        output_dir (str): Path to the directory to save SQLite-compatible SQL files.
+        output_dir (str): Path to the directory to save SQLite-compatible SQL files and shard databases.
         db_file (str): Path to the SQLite database file.
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        shards (int, optional): Number of shard databases to import into in parallel. Defaults to 1.
+        staging (bool, optional): Write the converted SQL to files in output_dir before importing it. Defaults to False.
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.sql'):
-            input_file = os.path.join(input_dir, filename)
-            output_file = os.path.join(output_dir, filename)
-            convert_postgres_to_sqlite(input_file, output_file)
-            import_to_sqlite(db_file, output_file)
-
-            # Remove the temporary output file after import
-            os.remove(output_file)  # comment this line if you want to keep the output files
-
-# Example usage
-input_dir = ""  # Replace with your PostgreSQL dump directory
-output_dir = ""  # Replace with your desired SQLite dump directory
-db_file = "tmp_database.db"  # Replace with your SQLite database file path
-convert_directory(input_dir, output_dir, db_file)
+    filenames = sorted(filename for filename in os.listdir(input_dir) if filename.endswith('.sql'))
+    input_files = [os.path.join(input_dir, filename) for filename in filenames]
+
+    if staging:
+        output_files = [os.path.join(output_dir, filename) for filename in filenames]
+        sources, import_function = output_files, import_files
+    else:
+        sources, import_function = input_files, import_dumps
+
+    # Stages 1 and 2 pipelined: the pool converts the next dumps while each converted file is imported in order
+    if staging and shards <= 1:
+        index_lines = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            conversions = executor.map(convert_postgres_to_sqlite, input_files, output_files)
+            for output_file, _ in zip(output_files, conversions):
+                index_lines.extend(import_files(db_file, [output_file]))
+
+    # Stage 2: import the dumps sequentially, converting them on the fly
+    elif shards <= 1:
+        index_lines = import_function(db_file, sources)
+
+    # Stage 2 (sharded): each worker owns a shard database, the shards are merged afterwards
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            table_names = list(executor.map(collect_table_names, input_files))
+            if staging:
+                # Stage 1: convert every dump in parallel
+                list(executor.map(convert_postgres_to_sqlite, input_files, output_files))
+
+        partitions = partition_by_table(input_files, table_names, shards)
+        if len(partitions) < shards:
+            print(f"Dumps share tables, importing into {len(partitions)} shards instead of {shards}.")
+        shard_groups = [[sources[index] for index in partition] for partition in partitions]
+        shard_files = [os.path.join(output_dir, f"shard{shard}.db") for shard in range(len(shard_groups))]
+
+        # Shard databases left by an interrupted run would be appended to and merged again
+        for shard_file in shard_files:
+            for path in (shard_file, f"{shard_file}-wal", f"{shard_file}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            index_lines = [line for lines in executor.map(import_function, shard_files, shard_groups) for line in lines]
+        merge_shards(db_file, shard_files)
+
+    # Stage 3: build the indexes once every row is in place
+    import_indexes(db_file, index_lines)
+
+    # Stage 4: validate the foreign keys that were not enforced during the load
+    check_foreign_keys(db_file)
+
+if __name__ == "__main__":
+    # Example usage
+    input_dir = ""  # Replace with your PostgreSQL dump directory
+    output_dir = ""  # Replace with your desired SQLite dump directory
+    db_file = "tmp_database.db"  # Replace with your SQLite database file path
+    staging = False  # Set to True to write the converted SQL files to output_dir before importing them (useful for debugging)
+    convert_directory(input_dir, output_dir, db_file, staging=staging)